@@ -1,17 +1,20 @@
 # Prefijo uuid
 ID_PREFIX = "TK-"
 
-# Set de stopwords en español comunes
-STOPWORDS = {"de", "la", "el", "y", "o", "que"}
+# Tag del LLM generador del RAG (permite filtrar sus tokens al hacer streaming)
+RAG_GENERATION_TAG = "rag_generation"
 
-# Frases que indican que RAG no sabe o no tiene información
-RAG_NEGATIVE_PHRASES = [
+# Set de stopwords en español comunes (inmutable)
+STOPWORDS = frozenset({"de", "la", "el", "y", "o", "que"})
+
+# Frases que indican que RAG no sabe o no tiene información (inmutable)
+RAG_NEGATIVE_PHRASES = (
     "no contiene información",
     "no se encontró información",
     "no incluye información",
     "no puedo responder",
-    "desconozco"
-]
+    "desconozco",
+)
 
 # Lista de ejemplos de consultas para el Helpdesk
 HELPDESK_EXAMPLES = [
@@ -1,5 +1,6 @@
 from typing import Dict
 import sqlite3
+import streamlit as st
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.checkpoint.sqlite import SqliteSaver
@@ -12,6 +13,27 @@ from .prompts import classification_prompt
 from .services.llm_client import llm_chain_openai
 
 
+# ======================================================
+# CADENAS LLM CACHEADAS
+# ======================================================
+
+@st.cache_resource
+def build_classification_chain():
+    """
+    Construye una sola vez la cadena de clasificación (prompt → LLM).
+    Evita recomponer la cadena en cada consulta de la zona gris.
+
+    El prompt no se pre-rellena con `.partial(...)`: sus tres variables
+    (pregunta, contexto, confianza) cambian en cada llamada.
+    """
+    llm = llm_chain_openai(
+        model=OPENAI_LLM_MODEL,
+        temperature=0.1,
+    )
+
+    return classification_prompt | llm
+
+
 # ======================================================
 # NODO 1: EJECUTAR RAG
 # ======================================================
@@ -24,14 +46,14 @@ def run_rag(state: HelpdeskState) -> Dict:
     result = query_rag(state["query"])
 
     return {
-        "rag_answer": result["answer"],
-        "confidence": result["confidence"],
-        "sources": result["sources"],
-        "rag_context": result.get("rag_context", result["answer"]),
+        "rag_answer": result.answer,
+        "confidence": result.confidence,
+        "sources": list(result.sources),
+        "rag_context": result.answer if result.rag_context is None else result.rag_context,
         "history": [
             "RAG ejecutado con MultiQuery + MMR",
-            f"Confianza heurística obtenida: {result['confidence']:.2f}",
-            f"Fuentes consultadas: {len(result['sources'])}",
+            f"Confianza heurística obtenida: {result.confidence:.2f}",
+            f"Fuentes consultadas: {len(result.sources)}",
         ],
     }
 
@@ -71,18 +93,13 @@ def classify_with_context(state: HelpdeskState) -> Dict:
     # =========================
     # Zona gris → LLM decide
     # =========================
-    llm = llm_chain_openai(
-        model=OPENAI_LLM_MODEL,
-        temperature=0.1,
-    )
+    classification_chain = build_classification_chain()
 
-    response = llm.invoke(
-        classification_prompt.format(
-            question=state["query"],
-            context=state.get("rag_context", ""),
-            confidence=confidence,
-        )
-    )
+    response = classification_chain.invoke({
+        "question": state["query"],
+        "context": state.get("rag_context", ""),
+        "confidence": confidence,
+    })
 
     content = response.content.lower()
 
@@ -157,7 +174,7 @@ def generate_final_answer(state: HelpdeskState) -> Dict:
     sources = state.get("sources", [])
 
     if sources:
-        answer += "\n\nFuentes consultadas: " + ", ".join(sources)
+        answer = f"{answer}\n\nFuentes consultadas: {', '.join(sources)}"
 
     return {
         "final_answer": answer,
@@ -218,6 +235,17 @@ def compile_helpdesk():
     Permite interrumpir y reanudar ejecuciones (human-in-the-loop).
     """
     conn = sqlite3.connect("helpdesk.db", check_same_thread=False)
+
+    # Ajustes SQLite para escrituras frecuentes de checkpoints:
+    # - WAL: los lectores no se bloquean mientras se escribe un checkpoint
+    # - synchronous=NORMAL: con WAL es seguro y reduce los fsync por escritura
+    # - temp_store=MEMORY: tablas temporales en memoria
+    # - mmap_size: lecturas vía memoria mapeada (256 MB)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+
     checkpointer = SqliteSaver(conn)
 
     graph = build_helpdesk_graph()
@@ -1,53 +1,45 @@
+import re
+import threading
 from typing import List, Tuple
+import numpy as np
 import streamlit as st
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
-from config_base import GENERATION_MODEL, SEARCH_K
+from config_base import (
+    GENERATION_MODEL,
+    SEARCH_K,
+    MMR_FETCH_K,
+    FAST_PATH_MAX_DISTANCE,
+    SHORT_QUERY_MAX_WORDS,
+    SHORT_QUERY_MAX_DISTANCE,
+    RETRIEVAL_CACHE_TTL,
+    RETRIEVAL_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MIN_OVERLAP,
+    SEMANTIC_CACHE_MAX_SIZE,
+    QUERY_CACHE_MAX_SIZE,
+    QUERY_CACHE_TTL,
+)
 from .services.llm_client import llm_chain_openai
-from .constants import RAG_NEGATIVE_PHRASES, STOPWORDS
+from .services.semantic_cache import SemanticCache
+from .services.query_cache import QueryCache
+from .services.utils import hash_text
+from .schemas import RagAnswer
+from .constants import RAG_GENERATION_TAG, RAG_NEGATIVE_PHRASES, STOPWORDS
 from .vectorstore import get_vectorstore
-from .retrievers import build_retriever
+from .retrievers import get_batched_retriever
 from .prompts import rag_prompt
 
+# Frases de "no sé" compiladas en una sola expresión: una pasada sobre la respuesta
+NEGATIVE_PHRASES_RE = re.compile("|".join(map(re.escape, RAG_NEGATIVE_PHRASES)))
+
+# Tokenizador de palabras (ignora signos de puntuación como ¿ ? , .)
+WORD_RE = re.compile(r"\w+")
+
 # ======================================================
 # Funciones auxiliares (NO usan LLM)
 # ======================================================
 
-def format_context(docs: List[Document]) -> str:
-    """
-    Convierte los documentos recuperados por el retriever
-    en un bloque de texto limpio y legible para el prompt RAG.
-
-    Responsabilidades:
-    - Limitar el número de documentos usados (SEARCH_K)
-    - Ignorar fragmentos vacíos
-    - Añadir encabezados y fuente para trazabilidad
-    - Devolver un único string listo para el prompt
-    """
-    parts = []
-
-    for i, doc in enumerate(docs[:SEARCH_K], 1):
-        content = doc.page_content.strip()
-
-        # Ignorar documentos sin contenido útil
-        if not content:
-            continue
-
-        # Encabezado del fragmento
-        header = f"[Document {i}]"
-
-        # Fuente opcional (filename)
-        filename = doc.metadata.get("filename")
-        if filename:
-            header += f" - Source: {filename}"
-
-        parts.append(f"{header}\n{content}")
-
-    # El prompt RAG recibirá este texto como {contexto}
-    return "\n\n".join(parts)
-
-
 def compute_confidence(query: str, rag_answer: str | None, docs: List[Document], scored_docs: List[Tuple[Document, float]]) -> float:
     """
     Calcula una confianza heurística entre 0 y 1 basada en:
@@ -70,7 +62,7 @@ def compute_confidence(query: str, rag_answer: str | None, docs: List[Document],
     # =========================
     # Penalización fuerte si el modelo dice que no sabe
     # =========================
-    if any(phrase in answer_lower for phrase in RAG_NEGATIVE_PHRASES):
+    if NEGATIVE_PHRASES_RE.search(answer_lower):
         return 0.2  # muy baja confianza
 
     # =========================
@@ -82,12 +74,12 @@ def compute_confidence(query: str, rag_answer: str | None, docs: List[Document],
     # Señal de retrieval (SCORES)
     # =========================
     if scored_docs:
-        distances = [score for _, score in scored_docs]
-
-        # Normalizar distancia → similitud (0..1]
-        similarities = [1 / (1 + d) for d in distances]
+        distances = np.fromiter(
+            (score for _, score in scored_docs), dtype=np.float64, count=len(scored_docs)
+        )
 
-        avg_similarity = sum(similarities) / len(similarities)
+        # Normalizar distancia → similitud (0..1] y promediar en NumPy
+        avg_similarity = float(np.reciprocal(1.0 + distances).mean())
 
         # Peso fuerte: retrieval es clave
         confidence += 0.4 * avg_similarity
@@ -95,6 +87,9 @@ def compute_confidence(query: str, rag_answer: str | None, docs: List[Document],
     # =========================
     # Cantidad de documentos útiles
     # =========================
+    # `docs` es la lista completa recuperada (antes del recorte a SEARCH_K
+    # del contexto): la unión de variantes MultiQuery o los MMR_FETCH_K
+    # candidatos del camino rápido
     if len(docs) >= 5:
         confidence += 0.1
     elif len(docs) >= 3:
@@ -113,13 +108,13 @@ def compute_confidence(query: str, rag_answer: str | None, docs: List[Document],
     # =========================
     # Coincidencia léxica query ↔ respuesta
     # =========================
-    query_words = [
-        w for w in query_lower.split()
-        if w not in STOPWORDS
-    ]
+    # Intersección de conjuntos de palabras: O(Q + A) en lugar de
+    # buscar cada palabra de la query como substring en toda la respuesta
+    query_words = set(WORD_RE.findall(query_lower)) - STOPWORDS
 
     if query_words:
-        matches = sum(1 for w in query_words if w in answer_lower)
+        answer_words = set(WORD_RE.findall(answer_lower))
+        matches = len(query_words & answer_words)
         match_ratio = matches / len(query_words)
         confidence += 0.2 * match_ratio
 
@@ -129,37 +124,60 @@ def compute_confidence(query: str, rag_answer: str | None, docs: List[Document],
     return min(max(confidence, 0.0), 1.0)
 
 
-def extract_sources(docs: List[Document]) -> List[str]:
+def prepare_docs(docs: List[Document]) -> Tuple[str, List[str]]:
     """
-    Extrae una lista de fuentes únicas (filename)
-    a partir de los documentos recuperados.
+    Convierte los documentos recuperados en el contexto del prompt RAG
+    y extrae sus fuentes, en una sola pasada.
+
+    Responsabilidades:
+    - Limitar el número de documentos usados (SEARCH_K)
+    - Ignorar fragmentos vacíos
+    - Añadir encabezados y fuente para trazabilidad
+    - Recoger las fuentes únicas (filename) para mostrarlas en la UI
 
-    Se usa para:
-    - Mostrar trazabilidad en la UI
-    - Dar transparencia al usuario
+    Devuelve (contexto formateado, fuentes únicas en orden de aparición).
     """
-    sources = []
+    parts = []
+    sources = {}  # dict como conjunto ordenado: deduplicación O(1)
 
-    for doc in docs[:SEARCH_K]:
+    for i, doc in enumerate(docs[:SEARCH_K], 1):
         filename = doc.metadata.get("filename")
-        if filename and filename not in sources:
-            sources.append(filename)
 
-    return sources
+        # La fuente cuenta aunque el fragmento esté vacío
+        if filename:
+            sources[filename] = None
+
+        content = doc.page_content.strip()
+        if not content:
+            continue
+
+        header = f"[Document {i}] - Source: {filename}" if filename else f"[Document {i}]"
+        parts.append(f"{header}\n{content}")
+
+    return "\n\n".join(parts), list(sources)
+
 
+def evidence_ids(scored_docs: List[Tuple[Document, float]]) -> frozenset:
+    """
+    Identifica los documentos recuperados por su contenido (hash).
+    Se usa para validar que una respuesta cacheada sigue respaldada
+    por los mismos documentos.
+    """
+    return frozenset(hash_text(doc.page_content) for doc, _ in scored_docs)
 
-def empty_rag_response(message: str, sources=None) -> dict:
+
+def empty_rag_response(message: str, sources=None) -> RagAnswer:
     """
     Devuelve una respuesta RAG vacía con un mensaje específico.
     Utilizado en casos donde no se pueden recuperar documentos relevantes.
     """
-    return {
-        "answer": message,
-        "confidence": 0.0,
-        "sources": sources or [],
-        "rag_context": "",
-        "requires_human": True,
-    }
+    return RagAnswer(
+        answer=message,
+        confidence=0.0,
+        sources=tuple(sources or ()),
+        rag_context="",
+        requires_human=True,
+    )
 
 
 
@@ -167,71 +185,213 @@ def empty_rag_response(message: str, sources=None) -> dict:
 # Construcción del pipeline RAG (LCEL)
 # ======================================================
 
-@st.cache_resource
+# Singleton de proceso para la cadena de generación (ver build_rag_chain)
+_rag_chain = None
+_rag_chain_lock = threading.Lock()
+
+
 def build_rag_chain():
     """
-    Construye el pipeline RAG completo usando LCEL.
+    Devuelve el pipeline de generación RAG (singleton de proceso).
+
+    Se construye una sola vez con doble comprobación y lock; las llamadas
+    siguientes son una simple lectura de variable, sin el hashing de
+    argumentos ni el lock de `st.cache_resource` en cada consulta.
+    (El pipeline sigue necesitando Streamlit: `retrieve_documents`
+    y las cachés de resultados usan `st.cache_data`/`st.cache_resource`.)
+    """
+    global _rag_chain
+
+    if _rag_chain is None:
+        with _rag_chain_lock:
+            if _rag_chain is None:
+                _rag_chain = _build_rag_chain()
+
+    return _rag_chain
+
+
+def _build_rag_chain():
+    """
+    Construye el pipeline de generación RAG usando LCEL.
 
     Flujo declarativo:
-    Pregunta del usuario
-      → Retriever (MMR + MultiQuery + opcional híbrido)
-      → Formateo del contexto
+    {contexto ya formateado, pregunta del usuario}
       → Prompt RAG
       → LLM generador
       → Texto plano como salida
-    """
 
-    # Retriever avanzado (vectorstore + estrategias)
-    retriever = build_retriever()
+    La recuperación NO forma parte de la cadena: query_rag recupera
+    los documentos una sola vez y los reutiliza para contexto,
+    fuentes y confianza.
+    """
 
     # LLM usado SOLO para generar la respuesta final
+    # - streaming: los tokens llegan a la UI según se generan
+    # - tag: permite distinguir sus tokens de los del resto de LLMs del grafo
     llm_generation = llm_chain_openai(
         model=GENERATION_MODEL,
         temperature=0,  # respuestas deterministas
-    )
+        streaming=True,
+    ).with_config(tags=[RAG_GENERATION_TAG])
 
-    # Pipeline LCEL
+    # Pipeline LCEL: el prompt recibe directamente {"context", "question"}
     rag_chain = (
-        {
-            # El retriever recibe la consulta y produce contexto
-            "context": retriever | format_context,
-
-            # La consulta pasa directamente al prompt
-            "question": RunnablePassthrough(),
-        }
-        | rag_prompt
+        rag_prompt
         | llm_generation
         | StrOutputParser()
     )
 
-    return rag_chain, retriever
+    return rag_chain
 
 
-# ======================================================
-# API pública del módulo RAG
-# ======================================================
+@st.cache_data(
+    ttl=RETRIEVAL_CACHE_TTL,
+    max_entries=RETRIEVAL_CACHE_MAX_ENTRIES,
+    show_spinner=False,
+)
+def retrieve_documents(query: str) -> List[Document]:
+    """
+    Recupera documentos con el retriever avanzado (MMR + MultiQuery ± Hybrid).
+
+    Se cachea por consulta: la misma pregunta no vuelve a pagar
+    las reformulaciones MultiQuery ni las búsquedas vectoriales.
+    Las consultas concurrentes se agrupan en micro-lotes (BatchedRetriever).
+    """
+    return get_batched_retriever().submit(query).result()
+
+
+def score_query(query: str) -> dict:
+    """
+    Embebe la consulta y busca directamente en el vectorstore
+    los documentos más similares junto con su distancia.
+
+    Busca MMR_FETCH_K candidatos (tantos como el MMR del retriever) para
+    que el camino rápido aporte una cantidad de documentos comparable
+    a la del MultiQuery en `compute_confidence`.
+
+    Devuelve:
+    - query_vector: embedding de la consulta (caché semántica)
+    - candidates: todos los documentos encontrados (camino rápido)
+    - scored_docs: los SEARCH_K mejores pares (documento, distancia) para la confianza
+    - evidence: IDs de esos SEARCH_K documentos (validación de la caché)
+    """
+    vectorstore = get_vectorstore()
+    query_vector = vectorstore.embeddings.embed_query(query)
+    all_scored = vectorstore.similarity_search_by_vector_with_relevance_scores(
+        query_vector, k=MMR_FETCH_K
+    )
+    scored_docs = all_scored[:SEARCH_K]
+
+    return {
+        "query_vector": query_vector,
+        "candidates": [doc for doc, _ in all_scored],
+        "scored_docs": scored_docs,
+        "evidence": evidence_ids(scored_docs),
+    }
+
+
+def use_fast_path(query: str, scored_docs: List[Tuple[Document, float]]) -> bool:
+    """
+    Decide si los documentos del scoring bastan como contexto
+    (sin MultiQuery: se ahorran la llamada LLM y una búsqueda por variante).
+
+    - Cualquier consulta cuyo mejor documento es casi idéntico
+    - Consultas cortas tipo palabra clave ("reset password") con una
+      coincidencia razonable: reformularlas apenas aporta recall
+
+    El camino rápido no penaliza la confianza: aporta los MMR_FETCH_K
+    candidatos del scoring, una cantidad comparable a la del MultiQuery.
+    """
+    if not scored_docs:
+        return False
+
+    best_distance = scored_docs[0][1]
+    if best_distance <= FAST_PATH_MAX_DISTANCE:
+        return True
+
+    significant_words = set(WORD_RE.findall(query.lower())) - STOPWORDS
+    return (
+        len(significant_words) <= SHORT_QUERY_MAX_WORDS
+        and best_distance <= SHORT_QUERY_MAX_DISTANCE
+    )
+
+
+@st.cache_resource
+def get_semantic_cache() -> SemanticCache:
+    """
+    Caché semántica compartida por todas las sesiones.
+    Permite responder consultas parafraseadas sin recuperar ni generar de nuevo.
+    """
+    return SemanticCache(
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        min_evidence_overlap=SEMANTIC_CACHE_MIN_OVERLAP,
+        max_size=SEMANTIC_CACHE_MAX_SIZE,
+    )
+
 
-def query_rag(query: str) -> dict:
+@st.cache_resource
+def get_query_cache() -> QueryCache:
+    """
+    Caché de resultados completos de query_rag (LRU + TTL), compartida por todas las sesiones.
+    Una pregunta repetida se responde sin recuperar, generar ni calcular confianza.
+    """
+    return QueryCache(
+        max_size=QUERY_CACHE_MAX_SIZE,
+        ttl_seconds=QUERY_CACHE_TTL,
+    )
+
+
+def _run_rag_pipeline(query: str) -> RagAnswer:
     """
-    Ejecuta una consulta RAG completa y devuelve un objeto dict con toda la información.
+    Ejecuta el pipeline RAG completo (sin caché de resultados).
+
+    La respuesta se genera con `invoke`, que pasa por la caché LLM global
+    (SQLite); `BaseChatModel.stream` no la consulta. Con `streaming=True`
+    en el cliente, los tokens siguen llegando a los callbacks del LLM
+    (modo "messages" del grafo).
 
     Flujo:
-    1) Recupera documentos relevantes con el retriever (MMR + MultiQuery ± Hybrid)
-    2) Formatea el contexto para el prompt RAG
-    3) Genera la respuesta con el LLM
-    4) Calcula confianza y extrae fuentes
-    5) Devuelve un dict con toda la información
+    1) Embebe la consulta y busca los documentos más similares (scoring)
+    2) Consulta la caché semántica: si hay una consulta casi idéntica
+       respaldada por los mismos documentos, devuelve su respuesta
+    3) Obtiene los documentos de contexto:
+       - Si el mejor documento del scoring es una coincidencia muy cercana
+         (o la consulta es corta y la coincidencia razonable),
+         reutiliza esos documentos (sin segunda recuperación)
+       - Si no, usa el retriever (MMR + MultiQuery ± Hybrid)
+    4) Formatea el contexto para el prompt RAG
+    5) Genera la respuesta con el LLM
+    6) Calcula confianza, extrae fuentes y guarda el resultado en la caché
+    7) Devuelve un RagAnswer con toda la información
 
     Casos especiales manejados:
     - Sin documentos encontrados → respuesta de error con baja confianza
     - Documentos sin contenido útil → mensaje de advertencia con confianza intermedia
     """
     
-    # Construir pipeline y retriever
-    rag_chain, retriever = build_rag_chain()
+    semantic_cache = get_semantic_cache()
+
+    # Scoring: embedding de la consulta + búsqueda directa con distancias
+    scoring = score_query(query)
+    query_vector = scoring["query_vector"]
+    scored_docs = scoring["scored_docs"]
+    evidence = scoring["evidence"]
 
-    # Recuperar documentos (también se usan para scoring y fuentes)
-    docs: List[Document] = retriever.invoke(query)
+    # ==========================================
+    # Caso 0: Consulta equivalente ya respondida
+    # ==========================================
+    cached = semantic_cache.lookup(query_vector, evidence)
+    if cached is not None:
+        return cached
+
+    # Documentos de contexto (también se usan para fuentes y confianza)
+    if use_fast_path(query, scored_docs):
+        # Coincidencia muy cercana o consulta corta: los documentos del
+        # scoring bastan y se evita el MultiQuery
+        # (lista completa: prepare_docs recorta el contexto a SEARCH_K)
+        docs: List[Document] = scoring["candidates"]
+    else:
+        docs = retrieve_documents(query)
     
     # ==========================================
     # Caso 1: No se recuperó ningún documento
@@ -241,9 +401,8 @@ def query_rag(query: str) -> dict:
             "No se encontró información relevante en la base de conocimiento."
         )
 
-    # Formatear contexto y extraer fuentes
-    context = format_context(docs)
-    sources = extract_sources(docs)
+    # Formatear contexto y extraer fuentes (una sola pasada)
+    context, sources = prepare_docs(docs)
 
     # ==========================================
     # Caso 2: Documentos existen pero sin contenido útil
@@ -257,18 +416,50 @@ def query_rag(query: str) -> dict:
     # ==========================================
     # Caso normal: ejecutar pipeline RAG
     # ==========================================
-    answer = rag_chain.invoke(query)
-    
-    # Acceso directo al vectorstore para scoring (opcional)
-    vectorstore = get_vectorstore()
-    scored_docs = vectorstore.similarity_search_with_score(query, k=SEARCH_K)
+    # La cadena (y su cliente LLM) solo se obtiene cuando de verdad se genera
+    rag_chain = build_rag_chain()
+
+    # invoke: pasa por la caché LLM (mismo prompt → sin llamada al proveedor)
+    answer = rag_chain.invoke({"context": context, "question": query})
     
     # Calcular confianza pieza clave del sistema para posterior clasificación
     confidence = compute_confidence(query, answer, docs, scored_docs)
 
+    result = RagAnswer(
+        answer=answer,
+        confidence=confidence,
+        sources=tuple(sources),
+    )
+
+    # Guardar en caché semántica para consultas equivalentes futuras
+    # (RagAnswer es inmutable: se comparte sin copiar)
+    semantic_cache.add(query_vector, evidence, result)
+
     # Devolver respuesta
-    return {
-        "answer": answer,
-        "confidence": confidence,
-        "sources": sources
-    }
+    return result
+
+
+# ======================================================
+# API pública del módulo RAG
+# ======================================================
+
+def query_rag(query: str) -> RagAnswer:
+    """
+    Ejecuta una consulta RAG completa y devuelve un RagAnswer con toda la información.
+
+    Primero consulta la caché de resultados por la consulta normalizada
+    (minúsculas, espacios colapsados). Si no hay resultado vigente,
+    ejecuta el pipeline RAG completo y guarda el resultado.
+    """
+    query_cache = get_query_cache()
+    cache_key = QueryCache.normalize(query)
+
+    cached = query_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    result = _run_rag_pipeline(query)
+    query_cache.put(cache_key, result)
+
+    return result
+
@@ -1,11 +1,47 @@
 import logging
+import threading
+from itertools import chain
 from langchain_classic.retrievers import EnsembleRetriever, MultiQueryRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
 from config_base import *
 from .services.llm_client import llm_chain_openai
 from .vectorstore import get_vectorstore
 from .prompts import multiquery_prompt
-import streamlit as st
+from .services.batched_retriever import BatchedRetriever
+
+# Singletons de proceso: el retriever se construye una sola vez y lo
+# comparten todas las sesiones de Streamlit y el hilo de micro-lotes
+_retriever: BaseRetriever | None = None
+_retriever_lock = threading.Lock()
+_batched_retriever: BatchedRetriever | None = None
+_batched_retriever_lock = threading.Lock()
+
+class ParallelMultiQueryRetriever(MultiQueryRetriever):
+    """
+    MultiQueryRetriever que busca todas las variantes de la consulta a la vez.
+
+    El original ejecuta el retriever base una vez por variante, en serie;
+    aquí se lanzan con `retriever.batch(...)` (hilos de LangChain), de modo
+    que la latencia es la de la búsqueda más lenta y no la suma de todas.
+    """
+
+    def retrieve_documents(
+        self, queries: list[str], run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        if not queries:
+            return []
+
+        results = self.retriever.batch(
+            queries,
+            config={
+                "callbacks": run_manager.get_child(),
+                "max_concurrency": len(queries),
+            },
+        )
+        # Mismo orden que la versión secuencial (variante por variante)
+        return list(chain.from_iterable(results))
 
 def setup_logging(debug: bool = False):
     """Configura el logging para el retriever MultiQuery."""
@@ -17,10 +53,46 @@ def setup_logging(debug: bool = False):
         logging.INFO if debug else logging.WARNING
     )
 
-@st.cache_resource
 def build_retriever() -> BaseRetriever:
     """
-    Construye y devuelve el retriever principal del sistema RAG.
+    Devuelve el retriever principal del sistema RAG (singleton de proceso).
+
+    Usa doble comprobación con lock: tras la primera construcción,
+    cada llamada es una simple lectura de variable, sin el hashing
+    de argumentos ni el lock de `st.cache_resource`.
+    """
+    global _retriever
+
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = _build_retriever()
+
+    return _retriever
+
+def get_batched_retriever() -> BatchedRetriever:
+    """
+    Devuelve el retriever principal envuelto en micro-lotes (singleton de proceso).
+
+    Las consultas que llegan a la vez desde varias sesiones se agrupan
+    y se resuelven con una sola llamada a `retriever.batch(...)`.
+    """
+    global _batched_retriever
+
+    if _batched_retriever is None:
+        with _batched_retriever_lock:
+            if _batched_retriever is None:
+                _batched_retriever = BatchedRetriever(
+                    build_retriever(),
+                    window_ms=RETRIEVAL_BATCH_WINDOW_MS,
+                    max_batch_size=RETRIEVAL_BATCH_MAX_SIZE,
+                )
+
+    return _batched_retriever
+
+def _build_retriever() -> BaseRetriever:
+    """
+    Construye el retriever principal del sistema RAG.
 
     Estrategia utilizada:
     1) MMR Retriever → evita fragmentos redundantes
@@ -29,6 +101,11 @@ def build_retriever() -> BaseRetriever:
 
     El resultado es un retriever robusto, equilibrado y tolerante
     a preguntas mal formuladas o incompletas.
+
+    La unión de variantes (y la fusión híbrida) puede devolver más de
+    SEARCH_K documentos: no se recorta aquí porque la cantidad de documentos
+    recuperados es una señal de `compute_confidence`; el contexto del
+    prompt se limita a SEARCH_K en `prepare_docs`.
     """
     
     # === Acceso al vectorstore persistido (ChromaDB) ===
@@ -78,14 +155,14 @@ def build_retriever() -> BaseRetriever:
     # ------------------------------------------------------
     # Objetivo:
     # - Generar múltiples versiones de la pregunta del usuario
-    # - Ejecutar MMR para cada variante
+    # - Ejecutar MMR para cada variante (en paralelo)
     # - Unir resultados y eliminar duplicados
     #
     # Beneficio:
     # - Aumenta el recall
     # - Reduce dependencia de una única formulación
     # ======================================================
-    mmr_multi_retriever = MultiQueryRetriever.from_llm(
+    mmr_multi_retriever = ParallelMultiQueryRetriever.from_llm(
         retriever=base_retriever,   # MMR como base sólida
         llm=llm_queries,            # LLM para generar variantes
         prompt=multiquery_prompt,   # Prompt personalizado
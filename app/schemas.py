@@ -1,6 +1,26 @@
-from typing import TypedDict, Optional, List, Annotated
+from dataclasses import dataclass
+from typing import TypedDict, Optional, List, Annotated, Tuple
 from operator import add
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
+
+# ======================================================
+# RESULTADO DEL RAG (sin validación, se crea en cada consulta)
+# ======================================================
+
+@dataclass(frozen=True, slots=True)
+class RagAnswer:
+    """
+    Resultado de query_rag.
+
+    Dataclass inmutable con slots en lugar de dict o modelo Pydantic:
+    construcción barata, menos memoria por instancia y, al ser inmutable,
+    las cachés pueden devolver la misma instancia sin copiarla.
+    """
+    answer: str
+    confidence: float
+    sources: Tuple[str, ...] = ()
+    rag_context: Optional[str] = None
+    requires_human: bool = False
 
 # ======================================================
 # ESQUEMA Pydantic para VALIDACIÓN DE DATOS DEL GRAFO
@@ -22,6 +42,10 @@ class HelpdeskStateModel(BaseModel):
     final_answer: Optional[str]
     history: List[str] = []
 
+# Adaptador compilado una sola vez: valida un dict directamente en pydantic-core
+# (sin desempaquetar kwargs ni pasar por el __init__ del modelo)
+HELPDESK_STATE_ADAPTER = TypeAdapter(HelpdeskStateModel)
+
 # ======================================================
 # ESQUEMA TypedDict para ESTADO MUTABLE DEL GRAFO
 # ======================================================
@@ -0,0 +1,96 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable
+
+
+class BatchedRetriever:
+    """
+    Agrupa en micro-lotes las consultas concurrentes al retriever.
+
+    Cada llamada a `submit` encola (consulta, Future). Un hilo en segundo
+    plano recoge las consultas que llegan dentro de una ventana de
+    `window_ms` milisegundos y las resuelve con una sola llamada a
+    `retriever.batch(...)`, que las ejecuta en paralelo.
+
+    - Consultas idénticas dentro del mismo lote se recuperan una sola vez
+    - Un error en una consulta solo afecta a su Future
+    - Sin carga (una sola consulta en cola) no se espera la ventana
+    - Los Futures cancelados se descartan sin recuperar su consulta
+    """
+
+    def __init__(self, retriever: Runnable, window_ms: float, max_batch_size: int):
+        self.retriever = retriever
+        self.window_seconds = window_ms / 1000
+        self.max_batch_size = max_batch_size
+
+        self._queue: "queue.Queue[tuple[str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run, name="batched-retriever", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, query: str) -> "Future[List[Document]]":
+        """Encola una consulta; el resultado se obtiene con `.result()`."""
+        future: Future = Future()
+        self._queue.put((query, future))
+        return future
+
+    def _collect_batch(self) -> List[tuple[str, Future]]:
+        """Espera la primera consulta y añade las que lleguen dentro de la ventana."""
+        batch = [self._queue.get()]
+
+        # Consulta aislada: se resuelve ya, sin pagar la ventana de espera
+        # (con carga, las que llegan mientras se procesa forman el siguiente lote)
+        if self._queue.empty():
+            return batch
+
+        deadline = time.monotonic() + self.window_seconds
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self) -> None:
+        """Bucle del hilo: recoge un lote, lo recupera y resuelve cada Future."""
+        while True:
+            # Descartar los Futures cancelados: resolverlos lanzaría
+            # InvalidStateError y mataría el hilo
+            batch = [
+                (query, future)
+                for query, future in self._collect_batch()
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            # Consultas únicas del lote (conservando el orden de llegada)
+            queries = list(dict.fromkeys(query for query, _ in batch))
+
+            try:
+                results = self.retriever.batch(
+                    queries,
+                    config={"max_concurrency": len(queries)},
+                    return_exceptions=True,
+                )
+            except Exception as exc:
+                results = [exc] * len(queries)
+
+            by_query = dict(zip(queries, results))
+
+            for query, future in batch:
+                result = by_query[query]
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
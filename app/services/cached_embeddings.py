@@ -0,0 +1,48 @@
+import threading
+from collections import OrderedDict
+from typing import List
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envoltorio de un modelo de embeddings con caché LRU para `embed_query`.
+
+    La misma consulta se embebe varias veces por petición (scoring,
+    retriever de similitud, MMR...) y entre sesiones. Con esta caché solo
+    la primera vez paga la llamada a la API; las siguientes son una
+    búsqueda en memoria.
+
+    - Clave: texto exacto de la consulta (el embedding depende de él)
+    - Sin caducidad: para un mismo modelo, el vector de un texto no cambia
+    - `embed_documents` se delega sin caché (indexación, textos únicos)
+    """
+
+    def __init__(self, embeddings: Embeddings, max_size: int):
+        self.embeddings = embeddings
+        self.max_size = max_size
+
+        self._entries: OrderedDict[str, List[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            vector = self._entries.get(text)
+            if vector is not None:
+                self._entries.move_to_end(text)
+                return vector
+
+        # La llamada a la API se hace fuera del lock
+        vector = self.embeddings.embed_query(text)
+
+        with self._lock:
+            self._entries[text] = vector
+            self._entries.move_to_end(text)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return vector
@@ -1,8 +1,12 @@
+from functools import lru_cache
 from openai import AsyncOpenAI
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
 from .utils import get_env
 from config_base import (
+    LLM_CACHE_PATH,
     DEFAULT_LLM_MODEL,
     FALLBACK_LLM_MODEL,
     OPENAI_LLM_MODEL,
@@ -17,6 +21,11 @@ GOOGLEAI_API_KEY = get_env("GOOGLEAI_API_KEY")
 GROQ_API_KEY = get_env("GROQ_API_KEY")
 GROQ_BASE_URL = get_env("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
 
+# Caché global de LangChain: un mismo prompt con el mismo modelo y parámetros
+# se responde desde SQLite sin volver a llamar al proveedor.
+# Afecta a todos los clientes LangChain de este módulo (clasificación, RAG, MultiQuery).
+set_llm_cache(SQLiteCache(database_path=str(LLM_CACHE_PATH)))
+
 # ============================================================
 # 1) CLIENTE SIMPLE (async, sin LangChain)
 # ============================================================
@@ -119,8 +128,10 @@ def llm_chain_groq(model: str | None = None, temperature: float = 0.0) -> ChatOp
         ) from e
     
 # Devuelve un objeto ChatOpenAI configurado para OpenAI. Compatible con LLMChain, RouterChain, MultiPromptChain, agentes, etc.
+# Se cachea por (model, temperature, streaming): el mismo cliente (y su pool HTTP keep-alive) se reutiliza entre llamadas.
 # ---------- OpenAI ----------
-def llm_chain_openai(model: str | None = None, temperature: float = 0.7,) -> ChatOpenAI:
+@lru_cache(maxsize=8)
+def llm_chain_openai(model: str | None = None, temperature: float = 0.7, streaming: bool = False,) -> ChatOpenAI:
     if not OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY no está configurada.")
     
@@ -129,6 +140,7 @@ def llm_chain_openai(model: str | None = None, temperature: float = 0.7,) -> Cha
     llm_params = {
         "api_key": OPENAI_API_KEY,
         "temperature": temperature,
+        "streaming": streaming,  # emite tokens según se generan (menor tiempo al primer token)
     }
     
     try:
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class QueryCache:
+    """
+    Caché LRU con caducidad (TTL) para resultados completos de query_rag.
+
+    - Clave: consulta normalizada (minúsculas, espacios colapsados)
+    - Valor: resultado (RagAnswer) + instante en que se guardó
+    - Al superar `max_size` se descarta la entrada menos usada
+    - Las entradas más antiguas que `ttl_seconds` se consideran caducadas
+
+    Es segura entre hilos (Streamlit atiende cada sesión en su propio hilo).
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normaliza la consulta para que variaciones triviales compartan clave."""
+        return " ".join(query.lower().split())
+
+    def get(self, key: str) -> Optional[Any]:
+        """Devuelve el resultado cacheado o None si no existe o ha caducado."""
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self._misses += 1
+                return None
+
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._misses += 1
+                return None
+
+            # Marcar como usada recientemente
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Guarda un resultado, expulsando el menos usado si se supera el tamaño."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """Vacía la caché (p. ej. tras indexar documentos nuevos)."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """Estadísticas de uso: aciertos, fallos, ratio de acierto y tamaño."""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total else 0.0,
+                "size": len(self._entries),
+            }
@@ -0,0 +1,99 @@
+import threading
+from typing import Any, List, Optional, Sequence
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Caché semántica de respuestas RAG.
+
+    Guarda el embedding normalizado de cada consulta ya respondida junto con:
+    - La respuesta completa (RagAnswer devuelto por query_rag)
+    - Los IDs de los documentos que la respaldan (evidencia)
+
+    Una consulta nueva reutiliza una respuesta si:
+    1) Su similitud coseno con una consulta previa supera `threshold`
+    2) La evidencia recuperada ahora coincide con la de entonces
+       (Jaccard >= `min_evidence_overlap`), para no servir una respuesta
+       parecida pero basada en otros documentos.
+
+    Los embeddings se guardan en una matriz preasignada de `max_size` filas
+    usada como buffer circular: añadir una entrada escribe una fila (sin
+    copiar la matriz) y, con la caché llena, sobrescribe la más antigua.
+    """
+
+    def __init__(self, threshold: float, min_evidence_overlap: float, max_size: int):
+        self.threshold = threshold
+        self.min_evidence_overlap = min_evidence_overlap
+        self.max_size = max_size
+
+        # (max_size, dim) embeddings normalizados; se asigna en el primer `add`
+        # (la dimensión la fija el primer vector)
+        self._matrix: Optional[np.ndarray] = None
+        self._evidence: List[Optional[frozenset]] = [None] * max_size
+        self._responses: List[Any] = [None] * max_size
+        self._count = 0  # filas ocupadas
+        self._next = 0   # fila que escribirá el próximo `add`
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        """Convierte a float32 y normaliza a norma 1 (coseno = producto escalar)."""
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    @staticmethod
+    def _jaccard(a: frozenset, b: frozenset) -> float:
+        """Solapamiento entre dos conjuntos de IDs (1.0 = idénticos)."""
+        if not a and not b:
+            return 1.0
+        return len(a & b) / len(a | b)
+
+    def lookup(self, query_vector: Sequence[float], evidence_ids: frozenset) -> Optional[Any]:
+        """
+        Devuelve la respuesta cacheada más similar si supera el umbral
+        y su evidencia coincide con la actual. En otro caso, None.
+        """
+        with self._lock:
+            if not self._count:
+                return None
+
+            # Una sola multiplicación matriz-vector para todas las similitudes
+            similarities = self._matrix[:self._count] @ self._normalize(query_vector)
+            best = int(np.argmax(similarities))
+
+            if similarities[best] < self.threshold:
+                return None
+
+            if self._jaccard(self._evidence[best], evidence_ids) < self.min_evidence_overlap:
+                return None
+
+            return self._responses[best]
+
+    def add(self, query_vector: Sequence[float], evidence_ids: frozenset, response: Any) -> None:
+        """
+        Añade una respuesta a la caché.
+        Si se supera `max_size`, sobrescribe la entrada más antigua.
+        """
+        row = self._normalize(query_vector)
+
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.empty((self.max_size, row.shape[0]), dtype=np.float32)
+
+            slot = self._next
+            self._matrix[slot] = row
+            self._evidence[slot] = evidence_ids
+            self._responses[slot] = response
+
+            self._next = (slot + 1) % self.max_size
+            self._count = min(self._count + 1, self.max_size)
+
+    def clear(self) -> None:
+        """Vacía la caché (p. ej. tras reindexar documentos)."""
+        with self._lock:
+            self._evidence = [None] * self.max_size
+            self._responses = [None] * self.max_size
+            self._count = 0
+            self._next = 0
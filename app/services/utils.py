@@ -1,6 +1,6 @@
 import os
-import hashlib
 import uuid
+from blake3 import blake3
 from dotenv import load_dotenv
 from app.constants import ID_PREFIX
 
@@ -17,9 +17,21 @@ def get_env(name: str, default=None):
 
 def hash_text(text: str) -> str:
     """
-    Genera un hash único (SHA-256) para un texto.
+    Genera un hash único (BLAKE3, 128 bits) para un texto.
+    BLAKE3 usa SIMD internamente y es varias veces más rápido que SHA-256.
     """
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return blake3(text.encode("utf-8")).hexdigest(length=16)
+
+def hash_parts(*parts: str) -> str:
+    """
+    Hash BLAKE3 de la concatenación de varios textos sin construirla:
+    cada parte se añade al hasher por separado.
+    Equivale a `hash_text("".join(parts))` (mismo ID).
+    """
+    hasher = blake3()
+    for part in parts:
+        hasher.update(part.encode("utf-8"))
+    return hasher.hexdigest(length=16)
 
 def generate_uuid() -> str:
     """
@@ -1,12 +1,19 @@
 import streamlit as st
+from collections import Counter
 from datetime import datetime
+from config_base import VALIDATE_GRAPH_STATE
 from .services.utils import generate_uuid
-from .constants import HELPDESK_EXAMPLES
+from .constants import HELPDESK_EXAMPLES, RAG_GENERATION_TAG
 from .graph import compile_helpdesk
-from .schemas import HelpdeskState, HelpdeskStateModel
+from .schemas import HelpdeskState, HelpdeskStateModel, HELPDESK_STATE_ADAPTER
 from .bootstrap import init_chroma
-from .vectorstore import get_vectorstore
+from .vectorstore import get_indexed_count
 
+# Opciones del selector de ejemplos (opción vacía + ejemplos), construidas una vez
+EXAMPLE_OPTIONS = ("",) + tuple(HELPDESK_EXAMPLES)
+
+# Campos del estado que se guardan en el ticket (los mismos que volcaba Pydantic)
+STATE_FIELDS = tuple(HelpdeskStateModel.model_fields)
 
 # ======================================================
 # Configuración de la página
@@ -46,11 +53,9 @@ def check_rag_setup() -> bool:
     """
     try:
         with st.spinner("🔍 Verificando configuración RAG..."):
-            # Cargar el vectorstore cacheado
-            vectorstore = get_vectorstore()
-            
-            # Contar documentos/chunks indexados
-            doc_count = len(vectorstore.get()["ids"])
+            # Contar documentos/chunks indexados (carga el vectorstore cacheado;
+            # recuento nativo de Chroma, cacheado entre reruns)
+            doc_count = get_indexed_count()
             
             if doc_count == 0:
                 st.warning("⚠️ Vectorstore OK pero no hay documentos indexados.")
@@ -85,6 +90,24 @@ def configure_rag() -> bool:
 # Ejecución del grafo LangGraph
 # ======================================================
 
+def _final_state_dict(values: dict) -> dict:
+    """
+    Convierte los valores del estado final del grafo en el dict que guarda la UI
+    (sin campos None).
+
+    El estado ya cumple HelpdeskState (lo construyen los reducers de LangGraph),
+    así que la validación Pydantic solo se ejecuta con VALIDATE_GRAPH_STATE.
+    """
+    if VALIDATE_GRAPH_STATE:
+        return HELPDESK_STATE_ADAPTER.validate_python(values).model_dump(exclude_none=True)
+
+    return {
+        field: values[field]
+        for field in STATE_FIELDS
+        if values.get(field) is not None
+    }
+
+
 def process_query(query: str, ticket_id: str) -> tuple[dict, list[str], dict]:
     """
     Ejecuta el grafo LangGraph usando streaming y checkpointing para procesar una consulta.
@@ -95,6 +118,7 @@ def process_query(query: str, ticket_id: str) -> tuple[dict, list[str], dict]:
     3. Se itera sobre los eventos parciales del grafo (streaming).
        - Cada evento puede contener la salida de varios nodos.
        - Se acumula el historial explicativo de cada nodo.
+       - Los tokens del LLM generador se muestran en vivo en la UI.
     4. Se obtiene el estado final consolidado del grafo.
     5. Se devuelve:
        - `final_state.values`: el estado final en formato dict, listo para la UI.
@@ -134,23 +158,43 @@ def process_query(query: str, ticket_id: str) -> tuple[dict, list[str], dict]:
     # Lista donde vamos a acumular todo el historial de pasos del grafo
     processing_history: list[str] = []
 
+    # Contenedor donde se muestra la respuesta RAG mientras se genera
+    answer_placeholder = st.empty()
+    streamed_answer = ""
+
     try:
         # ================================
         # 3. Streaming de actualizaciones del grafo
         # ================================
-        # El método stream() devuelve un iterable de stream_event
-        # Cada stream_event es un dict {nodo: salida_parcial}
-        # Esto permite mostrar progresos en tiempo real si quisiéramos
-        for stream_event in st.session_state.helpdesk.stream(
+        # Con varios stream_mode, stream() devuelve tuplas (modo, evento):
+        # - "updates": evento = dict {nodo: salida_parcial}
+        # - "messages": evento = (fragmento_de_mensaje, metadata) de los LLM
+        for stream_mode, stream_event in st.session_state.helpdesk.stream(
             initial_state,
             config=config,
-            stream_mode="updates"  # streaming parcial, recibe eventos a medida que se generan
+            stream_mode=["updates", "messages"]
         ):
+            if stream_mode == "messages":
+                # Solo se muestran los tokens del LLM generador del RAG
+                message_chunk, metadata = stream_event
+                if RAG_GENERATION_TAG in metadata.get("tags", []) and message_chunk.content:
+                    streamed_answer += message_chunk.content
+                    answer_placeholder.markdown(streamed_answer)
+                continue
+
             # Cada evento puede contener la salida de varios nodos
             for node, node_output in stream_event.items():
+                # "__interrupt__" (pausa antes de la intervención humana) no es un dict
+                if node == "__interrupt__":
+                    continue
+
                 # Si el nodo devuelve historial, se acumula en processing_history
-                if "history" in node_output and node_output["history"]:
-                    processing_history.extend(node_output["history"])
+                node_history = node_output.get("history")
+                if node_history:
+                    processing_history.extend(node_history)
+
+        # La respuesta completa se mostrará en el ticket
+        answer_placeholder.empty()
 
          # ================================
         # 4. Obtener estado final consolidado
@@ -162,11 +206,11 @@ def process_query(query: str, ticket_id: str) -> tuple[dict, list[str], dict]:
         final_state = st.session_state.helpdesk.get_state(config)
         
         # ================================
-        # 5. Validar con Pydantic
+        # 5. Limpiar (y opcionalmente validar con Pydantic)
         # ================================
         # final_state.values -> Diccionario limpio con solo los campos de HelpdeskState
         # Esto es seguro para guardar en st.session_state.tickets y mostrar en la UI
-        validated_final_state = HelpdeskStateModel(**final_state.values).model_dump(exclude_none=True)
+        validated_final_state = _final_state_dict(final_state.values)
 
 
         # ================================
@@ -179,6 +223,25 @@ def process_query(query: str, ticket_id: str) -> tuple[dict, list[str], dict]:
         st.error(f"❌ Error procesando consulta: {str(e)}")
         return None, [], None
 
+def ticket_status(result: dict) -> str:
+    """
+    Estado de un ticket a partir de su resultado:
+    "rag" (resuelto automáticamente), "human" (resuelto por un agente) o "pending".
+    Se calcula al crear o actualizar el ticket, no en cada rerun.
+    """
+    if not result.get("final_answer"):
+        return "pending"
+    return "human" if result.get("requires_human") else "rag"
+
+def set_ticket_result(ticket_data: dict, result: dict) -> None:
+    """
+    Guarda el resultado del grafo en el ticket junto con los datos derivados
+    que la UI muestra en cada rerun (estado y fuentes ya unidas en un texto).
+    """
+    ticket_data["result"] = result
+    ticket_data["status"] = ticket_status(result)
+    ticket_data["sources_text"] = ", ".join(result.get("sources", []))
+
 # ======================================================
 # Reanudación grafo tras intervención humana
 # ======================================================
@@ -220,10 +283,14 @@ def resume_with_human_answer(ticket_config: dict, human_answer: str,) -> tuple[d
             stream_mode="updates",
         ):  
             # Cada event puede contener la salida de varios nodos
-            for _, node_output in stream_event.items():
+            for node, node_output in stream_event.items():
+                if node == "__interrupt__":
+                    continue
+
                 # Si el nodo devuelve historial de pasos, lo añadimos al ticket
-                if node_output.get("history"):
-                    resumed_history.extend(node_output["history"])
+                node_history = node_output.get("history")
+                if node_history:
+                    resumed_history.extend(node_history)
 
         # ================================
         # 3️⃣ Obtener el estado final consolidado del grafo
@@ -233,14 +300,11 @@ def resume_with_human_answer(ticket_config: dict, human_answer: str,) -> tuple[d
         final_state = st.session_state.helpdesk.get_state(ticket_config)
 
         # ================================
-        # 4️⃣ Validar y guardar el estado final
+        # 4️⃣ Limpiar y guardar el estado final
         # ================================
-        # Se valida con Pydantic para asegurar consistencia
-        # model_dump(exclude_none=True) elimina campos vacíos para mantener el estado limpio
-        validated_state = (
-            HelpdeskStateModel(**final_state.values)
-            .model_dump(exclude_none=True)
-        )
+        # Se eliminan los campos vacíos para mantener el estado limpio
+        # (validación Pydantic solo con VALIDATE_GRAPH_STATE)
+        validated_state = _final_state_dict(final_state.values)
 
         return validated_state, resumed_history
 
@@ -326,7 +390,7 @@ def main():
         # Selectbox para elegir ejemplo
         selected_example = st.selectbox(
             "💡 Elige un ejemplo de consulta o deja vacío para escribir la tuya",
-            options=[""] + HELPDESK_EXAMPLES,
+            options=EXAMPLE_OPTIONS,
             index=0
         )
 
@@ -357,14 +421,15 @@ def main():
                     result, history, config = process_query(query, ticket_id)
 
                 if result:
-                    st.session_state.tickets[ticket_id] = {
+                    ticket_data = {
                         "user": user,
                         "query": query,
-                        "result": result,
                         "history": history,
                         "config": config,
                         "timestamp": datetime.now().strftime("%H:%M:%S"),
                     }
+                    set_ticket_result(ticket_data, result)
+                    st.session_state.tickets[ticket_id] = ticket_data
 
                     st.success(f"✅ Ticket {ticket_id} creado")
                     st.rerun()
@@ -381,9 +446,9 @@ def main():
             # Mostrar tickets más recientes primero
             # `st.session_state.tickets` es un dict que mantiene el orden de inserción.
             # `.items()` devuelve pares (ticket_id, ticket_data) en orden de creación.
-            # `list(...)` permite invertir el orden, ya que los iteradores no son reversibles.
-            # `reversed(...)` hace que los tickets más recientes se muestren primero en la UI.
-            for ticket_id, ticket_data in reversed(list(st.session_state.tickets.items())):
+            # Las vistas de dict son reversibles (Python 3.8+): `reversed(...)` las
+            # recorre al revés sin copiar los tickets a una lista en cada rerun.
+            for ticket_id, ticket_data in reversed(st.session_state.tickets.items()):
                 with st.expander(f"🎫 {ticket_id} - {ticket_data['timestamp']}", expanded=False):
 
                     st.markdown(f"**👤 Usuario:** {ticket_data.get('user', '—')}")
@@ -414,10 +479,8 @@ def main():
                         st.markdown(f"**🎯 Confianza RAG:** {confidence:.2f}")
                         st.progress(confidence)
 
-                        if result.get("sources"):
-                            st.markdown(
-                                f"**📚 Fuentes:** {', '.join(result['sources'])}"
-                            )
+                        if ticket_data["sources_text"]:
+                            st.markdown(f"**📚 Fuentes:** {ticket_data['sources_text']}")
 
                     # ----------------------------
                     # Human-in-the-loop: intervención humana
@@ -445,7 +508,7 @@ def main():
                                     
                                     # Actualizar el estado con la respuesta humana
                                     result, history = resume_with_human_answer(config, human_reply)
-                                    ticket_data["result"] = result
+                                    set_ticket_result(ticket_data, result)
                                     ticket_data["history"].extend(history)
 
                                     st.success("✅ Respuesta enviada")
@@ -463,7 +526,7 @@ def main():
                                     ticket_config=config,
                                     human_answer=result.get("rag_answer", "")
                                 )
-                                ticket_data["result"] = result
+                                set_ticket_result(ticket_data, result)
                                 ticket_data["history"].extend(history)
 
                                 st.success("✅ Respuesta RAG aplicada")
@@ -497,16 +560,11 @@ def main():
     if st.session_state.tickets:
         total = len(st.session_state.tickets)
 
-        resolved_rag = sum(
-            1 for t in st.session_state.tickets.values()
-            if t["result"].get("final_answer") and not t["result"].get("requires_human")
-        )
-
-        resolved_human = sum(
-            1 for t in st.session_state.tickets.values()
-            if t["result"].get("final_answer") and t["result"].get("requires_human")
-        )
+        # Una sola pasada sobre el estado precalculado de cada ticket
+        status_counts = Counter(t["status"] for t in st.session_state.tickets.values())
 
+        resolved_rag = status_counts["rag"]
+        resolved_human = status_counts["human"]
         pending = total - resolved_rag - resolved_human
 
         col_s1, col_s2, col_s3, col_s4 = st.columns(4)
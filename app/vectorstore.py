@@ -1,59 +1,278 @@
+import json
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import chromadb
 from langchain_community.vectorstores import Chroma
+from langchain_classic.embeddings import CacheBackedEmbeddings
+from langchain_classic.storage import LocalFileStore
 from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
-from app.services.utils import hash_text
+from app.services.cached_embeddings import CachedEmbeddings
+from app.services.utils import get_env, hash_parts
 import streamlit as st
 
-from config_base import CHROMA_PATH, EMBEDDING_MODEL, COLLECTION_NAME
+from config_base import (
+    CHROMA_PATH,
+    CHROMA_COLLECTION_METADATA,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_CACHE_MAX_SIZE,
+    COLLECTION_NAME,
+    DOC_COUNT_CACHE_TTL,
+    INDEX_BATCH_SIZE,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES,
+)
 
-@st.cache_resource
+# Servidor Chroma opcional (`chroma run --path ./chroma_db`).
+# Si no se define CHROMA_HOST se usa Chroma embebido y persistido en disco.
+CHROMA_HOST = get_env("CHROMA_HOST", "")
+CHROMA_PORT = int(get_env("CHROMA_PORT", "") or 8000)
+
+# IDs de chunk que este proceso ya ha confirmado (o insertado) en Chroma:
+# las reindexaciones siguientes no vuelven a preguntar por ellos
+_indexed_ids: set[str] = set()
+
+@st.cache_resource(show_spinner=False)
 def get_vectorstore() -> Chroma:
     """
     Devuelve el vectorstore persistido (o lo crea si no existe).
     Se cachea para evitar reconexiones repetidas.
+
+    Con EMBEDDING_DIMENSIONS, OpenAI devuelve vectores más cortos
+    (menos memoria y búsquedas HNSW más rápidas). Cada tamaño usa su
+    propia colección, ya que Chroma no admite mezclar dimensiones.
+
+    Los embeddings de chunks se guardan en disco (EMBEDDING_CACHE_PATH) por
+    hash del texto: reindexar en una colección nueva (cambio de esquema de
+    IDs, de splitter...) solo paga la API por el texto que no se había visto.
+
+    Con CHROMA_HOST se conecta a un servidor Chroma (modo cliente-servidor):
+    el índice vive en un único proceso compartido por todos los workers
+    en lugar de cargarse en cada uno.
     """
+    collection_name = COLLECTION_NAME
+    if EMBEDDING_DIMENSIONS:
+        collection_name = f"{COLLECTION_NAME}_{EMBEDDING_DIMENSIONS}d"
+
+    # Embeddings de chunks cacheados en disco; el namespace separa
+    # modelos y dimensiones (vectores no intercambiables)
+    document_embeddings = CacheBackedEmbeddings.from_bytes_store(
+        OpenAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            dimensions=EMBEDDING_DIMENSIONS,
+            # El SDK de OpenAI reintenta 429/5xx con backoff exponencial
+            # y respeta Retry-After: un pico de rate limit no aborta la indexación
+            max_retries=EMBEDDING_MAX_RETRIES,
+            # Tokens especiales como texto normal: tiktoken no recorre cada
+            # texto buscándolos (ni falla si aparece "<|endoftext|>")
+            disallowed_special=(),
+        ),
+        LocalFileStore(str(EMBEDDING_CACHE_PATH)),
+        namespace=f"{EMBEDDING_MODEL}_{EMBEDDING_DIMENSIONS or 'full'}",
+        key_encoder="blake2b",
+    )
+
+    # Los embeddings de consultas repetidas se sirven desde memoria
+    embedding_function = CachedEmbeddings(
+        document_embeddings,
+        max_size=EMBEDDING_CACHE_MAX_SIZE,
+    )
+
+    if CHROMA_HOST:
+        return Chroma(
+            client=chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT),
+            embedding_function=embedding_function,
+            collection_name=collection_name,
+            collection_metadata=CHROMA_COLLECTION_METADATA,
+        )
+
     return Chroma(
-        embedding_function=OpenAIEmbeddings(model=EMBEDDING_MODEL),
+        embedding_function=embedding_function,
         persist_directory=str(CHROMA_PATH),
-        collection_name=COLLECTION_NAME
+        collection_name=collection_name,
+        collection_metadata=CHROMA_COLLECTION_METADATA,
+    )
+
+@st.cache_data(ttl=DOC_COUNT_CACHE_TTL, show_spinner=False)
+def get_indexed_count() -> int:
+    """
+    Número de chunks indexados en la colección.
+
+    Usa el COUNT nativo de Chroma (sin transferir IDs) y se cachea entre
+    reruns de Streamlit; create_vectorstore lo invalida al indexar.
+    """
+    return get_vectorstore()._collection.count()
+
+@st.cache_resource(show_spinner=False)
+def warm_up_index() -> None:
+    """
+    Lanza una búsqueda mínima contra la colección para que Chroma cargue
+    el índice HNSW en memoria antes de la primera consulta de un usuario.
+
+    Consulta con el embedding de un chunk ya indexado: no llama a la API
+    de embeddings. Si la colección está vacía no hace nada.
+    Se ejecuta una sola vez por proceso (Streamlit re-ejecuta el bootstrap
+    en cada interacción).
+    """
+    collection = get_vectorstore()._collection
+
+    sample = collection.get(limit=1, include=["embeddings"])
+    embeddings = sample["embeddings"]
+    if embeddings is None or not len(embeddings):
+        return
+
+    collection.query(query_embeddings=[embeddings[0]], n_results=1, include=[])
+
+def _canonical_metadata(metadata: dict) -> str:
+    """
+    Serializa metadatos en JSON canónico (claves ordenadas, sin espacios):
+    el resultado no depende del orden de inserción de las claves.
+    """
+    return json.dumps(
+        metadata,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,  # valores no JSON (fechas, Path...) por su texto
     )
 
-def create_vectorstore(chunks: List[Document]) -> None:
+def compute_chunk_ids(chunks: List[Document]) -> List[str]:
+    """
+    Genera un ID estable por chunk usando el contenido + metadatos.
+    El mismo chunk produce siempre el mismo ID (base de la deduplicación).
+    Contenido y metadatos se hashean por partes, sin concatenarlos.
+
+    Los chunks de un mismo documento llegan seguidos y con metadatos iguales:
+    la serialización se reutiliza mientras los metadatos no cambian
+    (una por documento en lugar de una por chunk).
+    """
+    ids = []
+    last_metadata = None
+    last_serialized = ""
+
+    for chunk in chunks:
+        if chunk.metadata != last_metadata:
+            last_metadata = chunk.metadata
+            last_serialized = _canonical_metadata(last_metadata)
+
+        ids.append(hash_parts(chunk.page_content, last_serialized))
+
+    return ids
+
+def _embed_texts(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Calcula embeddings en paralelo.
+    Divide los textos en sub-lotes y lanza varias peticiones a la vez
+    (son llamadas de red, los hilos no compiten por la CPU).
+    Mantiene el orden de los textos de entrada.
+    """
+    batches = [
+        texts[start:start + EMBEDDING_BATCH_SIZE]
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+    ]
+
+    if len(batches) <= 1:
+        return embeddings.embed_documents(texts)
+
+    with ThreadPoolExecutor(max_workers=min(EMBEDDING_MAX_CONCURRENCY, len(batches))) as executor:
+        results = executor.map(embeddings.embed_documents, batches)
+
+    return [vector for batch_vectors in results for vector in batch_vectors]
+
+def _existing_ids(collection, ids: List[str], batch_size: int) -> set:
+    """
+    Devuelve cuáles de `ids` ya están en la colección.
+    Pregunta solo por esos IDs, sin payload (include=[]), y en tramos de
+    `batch_size` para no superar el límite de parámetros por consulta.
+    """
+    existing = set()
+
+    for start in range(0, len(ids), batch_size):
+        found = collection.get(ids=ids[start:start + batch_size], include=[])["ids"]
+        existing.update(found)
+
+    return existing
+
+def create_vectorstore(chunks: List[Document], ids: List[str] | None = None) -> None:
     """
     Indexa chunks NUEVOS en ChromaDB.
     - Mantiene los chunks existentes
     - Evita duplicados usando IDs hash
+    - Solo consulta a Chroma por los IDs candidatos (no descarga la colección)
+      y no repite la consulta para IDs ya confirmados en este proceso
+    - Los chunks ya indexados no se vuelven a embeber
+    - Inserta en lotes grandes con embeddings precalculados
     """
     
     vectorstore = get_vectorstore()
     
-    # Generar IDs únicos por chunk usando el contenido + metadatos
-    ids = [
-        hash_text(chunk.page_content + str(chunk.metadata))
-        for chunk in chunks
-    ]
+    # IDs precalculados por el llamador o generados aquí
+    if ids is None:
+        ids = compute_chunk_ids(chunks)
     
-    # Obtener IDs ya existentes en la colección
-    existing = set(vectorstore.get()["ids"])
+    # Tamaño de lote acotado por el máximo que acepta el cliente de Chroma
+    batch_size = min(INDEX_BATCH_SIZE, vectorstore._client.get_max_batch_size())
+
+    # Preguntar a Chroma SOLO por los IDs candidatos aún no confirmados,
+    # sin payload, por tramos
+    unconfirmed = [chunk_id for chunk_id in ids if chunk_id not in _indexed_ids]
+    _indexed_ids.update(_existing_ids(vectorstore._collection, unconfirmed, batch_size))
     
-    # Filtrar solo documentos nuevos
+    # Filtrar solo documentos nuevos, una vez cada uno: chunks idénticos en
+    # la misma carga comparten ID (se embeberían dos veces y Chroma
+    # rechaza IDs repetidos en un mismo add)
     new_chunks = []
     new_ids = []
+    seen = set()
     
     for chunk, chunk_id in zip(chunks, ids):
-        if chunk_id not in existing:
-            new_chunks.append(chunk)
-            new_ids.append(chunk_id)
+        if chunk_id in _indexed_ids or chunk_id in seen:
+            continue
+        seen.add(chunk_id)
+        new_chunks.append(chunk)
+        new_ids.append(chunk_id)
 
     if not new_chunks:
         print("📦 No hay chunks nuevos para indexar.")
         return
 
-    vectorstore.add_documents(
-        documents=new_chunks,
-        ids=new_ids,
-    )
+    def add_batch(batch_ids, texts, embeddings, metadatas):
+        vectorstore._collection.add(
+            ids=batch_ids,
+            documents=texts,
+            embeddings=embeddings,
+            metadatas=metadatas,
+        )
+        _indexed_ids.update(batch_ids)
 
-    print(f"✅ Se indexaron {len(new_chunks)} nuevos chunks en Chroma.")
+    # Escritura en Chroma en un hilo aparte: mientras se inserta el lote N
+    # se calculan los embeddings del lote N+1 (como mucho un lote en escritura)
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        pending_write = None
 
+        for start in range(0, len(new_chunks), batch_size):
+            batch = new_chunks[start:start + batch_size]
+            batch_ids = new_ids[start:start + batch_size]
+            texts = [chunk.page_content for chunk in batch]
+
+            # Embeddings calculados fuera de Chroma (en paralelo): Chroma solo almacena vectores
+            embeddings = _embed_texts(vectorstore.embeddings, texts)
+
+            # Esperar al lote anterior (conserva el orden y propaga sus errores)
+            if pending_write is not None:
+                pending_write.result()
+
+            pending_write = writer.submit(
+                add_batch, batch_ids, texts, embeddings, [chunk.metadata for chunk in batch]
+            )
+
+        pending_write.result()
+
+    # El recuento cacheado para la UI ya no es válido
+    get_indexed_count.clear()
+
+    print(f"✅ Se indexaron {len(new_chunks)} nuevos chunks en Chroma.")
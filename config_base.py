@@ -18,21 +18,79 @@ APP_PATH = ROOT_DIR / "app"
 # Carpeta de documentos
 DOCUMENTS_DIR = ROOT_DIR / "app" / "documents"
 
+# Base SQLite para la caché de respuestas LLM (LangChain)
+LLM_CACHE_PATH = ROOT_DIR / ".langchain_cache.db"
+
+# Caché en disco de embeddings de chunks (hash del texto → vector)
+EMBEDDING_CACHE_PATH = ROOT_DIR / ".embedding_cache"
+
 # === Configuración técnica ===
 
 # Nombre de la colección de documentos en la base de datos
-COLLECTION_NAME = "document_collection"
+# (v3: IDs de chunk con BLAKE3 sobre metadatos en JSON canónico;
+#  cambiar el esquema de IDs exige una colección nueva)
+COLLECTION_NAME = "document_collection_v3"
 
 # Modelos usado en la aplicación
 EMBEDDING_MODEL = "text-embedding-3-large"
+EMBEDDING_DIMENSIONS = None # Dimensiones reducidas (p. ej. 1024 o 256); None = tamaño completo del modelo
 QUERY_MODEL = "gpt-4o-mini"
 GENERATION_MODEL = "gpt-4o"
+EMBEDDING_CACHE_MAX_SIZE = 5000 # Embeddings de consultas cacheados en memoria (LRU)
 
 # Configuración del retriever
 SEARCH_TYPE = "mmr" # Tipo de búsqueda: 'similarity' o 'mmr'
 MMR_DIVERSITY_LAMBDA = 0.7 # Parámetro de diversidad para MMR
 MMR_FETCH_K = 20 # Número de documentos a recuperar antes de aplicar MMR
 SEARCH_K = 4 # Número de documentos finales a devolver
+FAST_PATH_MAX_DISTANCE = 0.25 # Distancia máxima del mejor documento para omitir MultiQuery (0 = idéntico)
+SHORT_QUERY_MAX_WORDS = 3 # Consultas con estas palabras significativas o menos se consideran búsquedas por palabra clave
+SHORT_QUERY_MAX_DISTANCE = 0.5 # Distancia máxima del mejor documento para omitir MultiQuery en consultas cortas
+
+# Caché de resultados del retriever
+RETRIEVAL_CACHE_TTL = 3600 # Segundos que se reutilizan los documentos recuperados para una consulta
+RETRIEVAL_CACHE_MAX_ENTRIES = 1024 # Consultas distintas cacheadas como máximo
+
+# Micro-lotes de consultas concurrentes al retriever
+RETRIEVAL_BATCH_WINDOW_MS = 10 # Ventana (ms) en la que se agrupan consultas que llegan a la vez
+RETRIEVAL_BATCH_MAX_SIZE = 16 # Consultas máximas por lote
+
+# Caché de resultados completos de query_rag (LRU + TTL)
+QUERY_CACHE_MAX_SIZE = 1000 # Consultas distintas cacheadas como máximo
+QUERY_CACHE_TTL = 600 # Segundos de validez de cada resultado
+
+# Caché semántica de respuestas RAG
+SEMANTIC_CACHE_THRESHOLD = 0.95 # Similitud coseno mínima entre consultas para reutilizar una respuesta
+SEMANTIC_CACHE_MIN_OVERLAP = 0.8 # Jaccard mínimo entre documentos recuperados (validación de evidencia)
+SEMANTIC_CACHE_MAX_SIZE = 500 # Número máximo de respuestas cacheadas
+
+# Precalentamiento de cachés con las consultas de ejemplo (HELPDESK_EXAMPLES)
+# Desactivado por defecto: lanza una consulta RAG completa por ejemplo (coste en API)
+WARMUP_EXAMPLES = False
+
+# Recuento de chunks indexados mostrado en la UI
+DOC_COUNT_CACHE_TTL = 60 # Segundos que se reutiliza el recuento entre reruns de Streamlit
+
+# Validar con Pydantic el estado final del grafo en cada consulta (útil en desarrollo)
+# Desactivado: el estado ya lo construyen los reducers de LangGraph sobre HelpdeskState
+VALIDATE_GRAPH_STATE = False
+
+# Configuración de indexación
+LOADER_MAX_WORKERS = 16 # Hilos para leer ficheros del directorio de documentos
+INDEX_BATCH_SIZE = 5000 # Chunks por cada inserción en Chroma (se limita al máximo que admite el cliente)
+EMBEDDING_BATCH_SIZE = 256 # Textos por cada petición de embeddings
+EMBEDDING_MAX_CONCURRENCY = 8 # Peticiones de embeddings simultáneas durante la indexación
+EMBEDDING_MAX_RETRIES = 6 # Reintentos con backoff exponencial ante 429 / 5xx / errores de conexión
+
+# Parámetros del índice HNSW de Chroma (solo se aplican al crear la colección)
+# batch_size / sync_threshold: vectores acumulados antes de volcar al índice
+# y antes de persistirlo; valores altos aceleran las cargas masivas
+CHROMA_COLLECTION_METADATA = {
+    "hnsw:construction_ef": 100,
+    "hnsw:M": 16,
+    "hnsw:batch_size": 1000,
+    "hnsw:sync_threshold": 2000,
+}
 
 # Configuracion alternativa para retriever hibrido
 ENABLE_HYBRID_SEARCH = True # Habilitar búsqueda híbrida (vectorial + palabras clave)